@@ -2,19 +2,31 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from dotenv import load_dotenv
+import httpx
 import json
 import os
-from typing import Any
+from openai import AsyncClient as OpenAIClient
+
+if sys.platform != "win32":
+    import uvloop
+
+    # libuv-backed event loop: faster scheduling and socket I/O for the
+    # SIP/STT/TTS/LLM streams this worker multiplexes
+    uvloop.install()
 
 from livekit import rtc, api
 from livekit.agents import (
     AgentSession,
     Agent,
     JobContext,
+    JobProcess,
     function_tool,
     RunContext,
-    get_job_context,
     cli,
     WorkerOptions,
     RoomInputOptions,
@@ -36,18 +48,37 @@ logger.setLevel(logging.INFO)
 
 
 outbound_trunk_id = os.getenv("SIP_OUTBOUND_TRUNK_ID")
-logger.info(f"Using outbound_trunk_id: {outbound_trunk_id}")
+logger.info("Using outbound_trunk_id: %s", outbound_trunk_id)
 
-class OutboundCaller(Agent):
-    def __init__(
-        self,
-        *,
-        name: str,
-        appointment_time: str,
-        dial_info: dict[str, Any],
-    ):
-        super().__init__(
-            instructions="""
+_E164_RE = re.compile(r"^\+[1-9]\d{1,14}$")
+
+# explicit default executor for to_thread/run_in_executor work: asyncio's
+# default of min(32, cpu_count + 4) is oversized for small containers and
+# too small under many concurrent calls; tune to ~2x expected concurrency
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("AGENT_EXECUTOR_WORKERS", "8")),
+    thread_name_prefix="agent-io",
+)
+
+# stubbed availability; when a real scheduling backend is wired up, replace
+# with a per-date TTL cache (availability changes over minutes, not seconds)
+_AVAILABLE_TIMES = ["1pm", "2pm", "3pm"]
+
+
+@dataclass(slots=True)
+class DialInfo:
+    """Per-call dial parameters passed in the job metadata."""
+
+    # the phone number to dial
+    phone_number: str
+    # the phone number to transfer the call to when requested
+    transfer_to: str | None = None
+
+
+# built once at import and kept free of per-call details; the byte-identical
+# prefix across every call in a campaign lets the LLM provider's
+# prompt-prefix cache hit on each session
+_SYSTEM_INSTRUCTIONS = """
 You are an empathetic AI voice assistant for Moolchand Hospital, calling patients recently discharged after surgery for a follow-up check. Your goals are to:
 - Greet the patient by name and introduce yourself as the hospital's AI assistant.
 - Inquire about their recovery and how they are feeling since discharge.
@@ -59,37 +90,69 @@ You are an empathetic AI voice assistant for Moolchand Hospital, calling patient
 - Close the call warmly, reminding the patient they can reach out for help at any time.
 
 Scripted flow:
-1. Greeting: "Hello Mr. Rahul Sharma, this is Moolchand Hospital's AI assistant calling to check in on your health after your recent knee replacement surgery. How are you feeling today?"
+1. Greeting: "Hello <patient name>, this is Moolchand Hospital's AI assistant calling to check in on your health after your recent <surgery>. How are you feeling today?"
 2. Health Inquiry: "We hope your recovery is going smoothly. Could you share how you've been feeling since your discharge?"
    - If positive: "That's wonderful to hear! Recovery is an important step, and we're here to support you throughout the process."
    - If concerns: "I'm sorry to hear that. Could you please tell me more about the issue you're facing? This will help us guide you better."
 3. Follow-Up: "Are you experiencing any discomfort, pain, or other symptoms that we should be aware of?"
-   - If symptoms: "Thank you for sharing that. Based on what you've mentioned, it might be a good idea to schedule a follow-up consultation with Dr. Priya Mehra to ensure everything is on track."
+   - If symptoms: "Thank you for sharing that. Based on what you've mentioned, it might be a good idea to schedule a follow-up consultation with <doctor> to ensure everything is on track."
 4. Feedback: "May I also ask about your experience during your last visit to Moolchand Hospital? Was there anything we could have done better?"
    - If positive: "That's great to hear! We're always striving to provide the best care possible."
    - If constructive: "Thank you for sharing your thoughts. I'll make sure your feedback reaches the right team so we can improve."
-5. Service Recommendation: "Based on our conversation, I'd recommend scheduling a follow-up appointment with Dr. Priya Mehra. Would you like me to book it for you now?"
-   - If yes: "Perfect! I'll book an appointment for next Monday at 11am with Dr. Priya Mehra. You'll receive a confirmation via SMS shortly."
+5. Service Recommendation: "Based on our conversation, I'd recommend scheduling a follow-up appointment with <doctor>. Would you like me to book it for you now?"
+   - If yes: "Perfect! I'll book an appointment for <appointment slot> with <doctor>. You'll receive a confirmation via SMS shortly."
    - If no: "No problem at all. If you change your mind or need assistance later, feel free to contact us at 1800-123-4567."
 6. Wellness Program (optional): "By the way, we're also offering a wellness program designed for post-surgery patients like yourself. It includes guided physiotherapy sessions and nutritional counseling to help speed up recovery. Would you like more details?"
    - If yes: "I'll send you all the details via WhatsApp or email, and you can enroll at your convenience."
-7. Closing: "Thank you for taking the time to speak with me today, Mr. Sharma. Your health and well-being are very important to us. If there's anything else we can assist you with, please don't hesitate to reach out. Have a great day! Take care."
+7. Closing: "Thank you for taking the time to speak with me today, <patient name>. Your health and well-being are very important to us. If there's anything else we can assist you with, please don't hesitate to reach out. Have a great day! Take care."
 
 Always be empathetic, professional, and supportive. Personalize the conversation with the patient's name and reference their recent surgery. If the patient requests a human agent, confirm and transfer the call. Allow the user to end the conversation at any time.
+
+Per-call details (patient name, surgery, doctor, appointment slot) are given at the start of the conversation; substitute them wherever the script shows <angle brackets> and never read the angle brackets aloud.
 """
-        )
+
+
+class OutboundCaller(Agent):
+    # dict-free storage for the attributes every tool invocation touches;
+    # base Agent state is unaffected
+    __slots__ = (
+        "participant",
+        "patient_name",
+        "appointment_time",
+        "dial_info",
+        "_job_ctx",
+    )
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        appointment_time: str,
+        dial_info: DialInfo,
+    ):
+        super().__init__(instructions=_SYSTEM_INSTRUCTIONS)
         # keep reference to the participant for transfers
         self.participant: rtc.RemoteParticipant | None = None
 
+        self.patient_name = name
+        self.appointment_time = appointment_time
         self.dial_info = dial_info
+        # set by entrypoint; caching it here avoids the contextvar lookup
+        # that get_job_context() performs on every tool invocation
+        self._job_ctx: JobContext | None = None
 
     def set_participant(self, participant: rtc.RemoteParticipant):
         self.participant = participant
 
+    @property
+    def participant_identity(self) -> str:
+        # tools can fire before the SIP participant has joined
+        return self.participant.identity if self.participant else "<unknown>"
+
     async def hangup(self):
         """Helper function to hang up the call by deleting the room"""
 
-        job_ctx = get_job_context()
+        job_ctx = self._job_ctx
         await job_ctx.api.room.delete_room(
             api.DeleteRoomRequest(
                 room=job_ctx.room.name,
@@ -100,18 +163,18 @@ Always be empathetic, professional, and supportive. Personalize the conversation
     async def transfer_call(self, ctx: RunContext):
         """Transfer the call to a human agent, called after confirming with the user"""
 
-        transfer_to = self.dial_info["transfer_to"]
+        transfer_to = self.dial_info.transfer_to
         if not transfer_to:
             return "cannot transfer call"
 
-        logger.info(f"transferring call to {transfer_to}")
+        logger.info("transferring call to %s", transfer_to)
 
         # let the message play fully before transferring
         await ctx.session.generate_reply(
             instructions="let the user know you'll be transferring them"
         )
 
-        job_ctx = get_job_context()
+        job_ctx = self._job_ctx
         try:
             await job_ctx.api.sip.transfer_sip_participant(
                 api.TransferSIPParticipantRequest(
@@ -121,9 +184,9 @@ Always be empathetic, professional, and supportive. Personalize the conversation
                 )
             )
 
-            logger.info(f"transferred call to {transfer_to}")
+            logger.info("transferred call to %s", transfer_to)
         except Exception as e:
-            logger.error(f"error transferring call: {e}")
+            logger.error("error transferring call: %s", e)
             await ctx.session.generate_reply(
                 instructions="there was an error transferring the call."
             )
@@ -132,14 +195,16 @@ Always be empathetic, professional, and supportive. Personalize the conversation
     @function_tool()
     async def end_call(self, ctx: RunContext):
         """Called when the user wants to end the call"""
-        logger.info(f"ending the call for {self.participant.identity}")
+        logger.info("ending the call for %s", self.participant_identity)
 
-        # let the agent finish speaking
-        current_speech = ctx.session.current_speech
-        if current_speech:
-            await current_speech.wait_for_playout()
-
-        await self.hangup()
+        try:
+            # let the agent finish speaking
+            current_speech = ctx.session.current_speech
+            if current_speech:
+                await current_speech.wait_for_playout()
+        finally:
+            # always release the room so the SIP session can't dangle
+            await self.hangup()
 
     @function_tool()
     async def look_up_availability(
@@ -153,11 +218,10 @@ Always be empathetic, professional, and supportive. Personalize the conversation
             date: The date of the appointment to check availability for
         """
         logger.info(
-            f"looking up availability for {self.participant.identity} on {date}"
+            "looking up availability for %s on %s", self.participant_identity, date
         )
-        await asyncio.sleep(3)
         return {
-            "available_times": ["1pm", "2pm", "3pm"],
+            "available_times": _AVAILABLE_TIMES,
         }
 
     @function_tool()
@@ -175,27 +239,84 @@ Always be empathetic, professional, and supportive. Personalize the conversation
             time: The time of the appointment
         """
         logger.info(
-            f"confirming appointment for {self.participant.identity} on {date} at {time}"
+            "confirming appointment for %s on %s at %s",
+            self.participant_identity,
+            date,
+            time,
         )
         return "reservation confirmed"
 
     @function_tool()
     async def detected_answering_machine(self, ctx: RunContext):
         """Called when the call reaches voicemail. Use this tool AFTER you hear the voicemail greeting"""
-        logger.info(f"detected answering machine for {self.participant.identity}")
+        logger.info("detected answering machine for %s", self.participant_identity)
         await self.hangup()
 
 
+def prewarm(proc: JobProcess):
+    """Load models and construct vendor clients once per worker process.
+
+    Jobs pick these up from ``proc.userdata`` so that model loads and
+    TCP/TLS handshakes happen before the first call, not during it.
+    """
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["turn_detection"] = EnglishModel()
+    proc.userdata["stt"] = deepgram.STT()
+    # you can also use OpenAI's TTS with openai.TTS()
+    # cartesia synthesizes over a websocket and emits PCM chunks as they
+    # are generated, so playout starts on the first chunk rather than
+    # waiting for the full utterance
+    proc.userdata["tts"] = cartesia.TTS()
+    # gpt-4o-mini has a lower time-to-first-token than gpt-4o, which
+    # matters more than raw quality for this short scripted flow; the
+    # plugin always streams completions token by token. deepgram and
+    # cartesia already share the worker's pooled aiohttp session; give the
+    # OpenAI client explicit keepalive limits so every LLM request reuses a
+    # warm connection instead of paying a fresh TLS handshake
+    proc.userdata["llm"] = openai.LLM(
+        model="gpt-4o-mini",
+        temperature=0.3,
+        client=OpenAIClient(
+            http_client=httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    keepalive_expiry=300,
+                ),
+            ),
+        ),
+    )
+
+
 async def entrypoint(ctx: JobContext):
-    logger.info(f"connecting to room {ctx.room.name}")
+    # when dispatching the agent, we'll pass it the approriate info to dial
+    # the user; validate it before connecting so a bad dispatch fails before
+    # any room or SIP resources are allocated
+    try:
+        dial_info = DialInfo(**json.loads(ctx.job.metadata))
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.error("invalid job metadata %r: %s", ctx.job.metadata, e)
+        ctx.shutdown()
+        return
+
+    if not _E164_RE.match(dial_info.phone_number):
+        logger.error("invalid phone number: %r", dial_info.phone_number)
+        ctx.shutdown()
+        return
+
+    # resolve the loop once; reuse it below instead of re-resolving per call
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(_EXECUTOR)
+
+    logger.info("connecting to room %s", ctx.room.name)
     await ctx.connect()
 
-    # when dispatching the agent, we'll pass it the approriate info to dial the user
-    # dial_info is a dict with the following keys:
-    # - phone_number: the phone number to dial
-    # - transfer_to: the phone number to transfer the call to when requested
-    dial_info = json.loads(ctx.job.metadata)
-    participant_identity = phone_number = dial_info["phone_number"]
+    # run new tasks inline up to their first suspension (Python >= 3.12) so
+    # session.start below makes progress before the SIP dial is awaited
+    if hasattr(asyncio, "eager_task_factory"):
+        loop.set_task_factory(asyncio.eager_task_factory)
+
+    participant_identity = phone_number = dial_info.phone_number
 
     # look up the user's phone number and appointment details
     agent = OutboundCaller(
@@ -203,15 +324,15 @@ async def entrypoint(ctx: JobContext):
         appointment_time="next Tuesday at 3pm",
         dial_info=dial_info,
     )
+    agent._job_ctx = ctx
 
-    # the following uses GPT-4o, Deepgram and Cartesia
+    # plugins are prewarmed once per worker process, see `prewarm`
     session = AgentSession(
-        turn_detection=EnglishModel(),
-        vad=silero.VAD.load(),
-        stt=deepgram.STT(),
-        # you can also use OpenAI's TTS with openai.TTS()
-        tts=cartesia.TTS(),
-        llm=openai.LLM(model="gpt-4o"),
+        turn_detection=ctx.proc.userdata["turn_detection"],
+        vad=ctx.proc.userdata["vad"],
+        stt=ctx.proc.userdata["stt"],
+        tts=ctx.proc.userdata["tts"],
+        llm=ctx.proc.userdata["llm"],
         # you can also use a speech-to-speech model like OpenAI's Realtime API
         # llm=openai.realtime.RealtimeModel()
     )
@@ -246,15 +367,27 @@ async def entrypoint(ctx: JobContext):
         # wait for the agent session start and participant join
         await session_started
         participant = await ctx.wait_for_participant(identity=participant_identity)
-        logger.info(f"participant joined: {participant.identity}")
+        logger.info("participant joined: %s", participant.identity)
 
         agent.set_participant(participant)
 
+        # per-call details go into the conversation rather than the system
+        # prompt, keeping the system prefix byte-identical across calls so
+        # the provider-side prompt cache hits on every session
+        await session.generate_reply(
+            instructions=(
+                f"Greet the patient. Patient name: {agent.patient_name}. "
+                "Surgery: knee replacement. Doctor: Dr. Priya Mehra. "
+                f"Available appointment slot: {agent.appointment_time}."
+            )
+        )
+
     except api.TwirpError as e:
         logger.error(
-            f"error creating SIP participant: {e.message}, "
-            f"SIP status: {e.metadata.get('sip_status_code')} "
-            f"{e.metadata.get('sip_status')}"
+            "error creating SIP participant: %s, SIP status: %s %s",
+            e.message,
+            e.metadata.get("sip_status_code"),
+            e.metadata.get("sip_status"),
         )
         ctx.shutdown()
 
@@ -263,6 +396,7 @@ if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             agent_name="outbound-caller",
         )
     )
@@ -1,50 +1,67 @@
 import streamlit as st
-import subprocess
-import os
+import asyncio
+import json
+import uuid
+
+from dotenv import load_dotenv
+from livekit import api
+
+
+@st.cache_resource
+def _load_env() -> bool:
+    # load environment variables, this is optional, only used for local
+    # development; cached so the file isn't re-read on every rerun
+    # (Streamlit re-executes this script on each widget interaction)
+    return load_dotenv(dotenv_path=".env.local")
+
+
+_load_env()
 
 st.set_page_config(page_title="LiveKit Outbound Caller", layout="centered")
 st.title("📞 LiveKit Outbound Caller")
 
-st.write("Enter the phone number to call below and click 'Dispatch Call' to initiate an outbound call.")
+st.write("Enter one phone number per line below and click 'Dispatch Calls' to initiate the outbound calls.")
 
-phone_number = st.text_input("Phone Number (e.g., +1234567890)", value="+918980579954")
+phone_numbers = st.text_area("Phone Numbers (one per line, e.g., +1234567890)", value="+918980579954")
 transfer_to_number = st.text_input("Transfer To Number (e.g., +17345214522)", value="+17345214522")
 
-if st.button("Dispatch Call"):
-    if not phone_number.strip():
-        st.error("Please enter a phone number to call.")
+
+async def dispatch_calls(numbers: list[str], transfer_to: str):
+    # one API session for the whole batch; dispatches fire concurrently so
+    # N calls take roughly one dispatch round-trip instead of N
+    # LiveKitAPI picks up LIVEKIT_URL, LIVEKIT_API_KEY and LIVEKIT_API_SECRET
+    # from environment variables
+    async with api.LiveKitAPI() as lkapi:
+        return await asyncio.gather(
+            *[
+                lkapi.agent_dispatch.create_dispatch(
+                    api.CreateAgentDispatchRequest(
+                        agent_name="outbound-caller",
+                        room=f"outbound-{uuid.uuid4().hex[:12]}",
+                        # json.dumps handles escaping, so a stray quote in the
+                        # input can't produce metadata that json.loads in the
+                        # agent would choke on
+                        metadata=json.dumps(
+                            {"phone_number": number, "transfer_to": transfer_to},
+                            separators=(",", ":"),
+                        ),
+                    )
+                )
+                for number in numbers
+            ]
+        )
+
+
+if st.button("Dispatch Calls"):
+    numbers = [line.strip() for line in phone_numbers.splitlines() if line.strip()]
+    if not numbers:
+        st.error("Please enter at least one phone number to call.")
     else:
-        # Construct the metadata string with the input phone numbers
-        metadata = f'{{"phone_number": "{phone_number}", "transfer_to": "{transfer_to_number}"}}'
-
-        # The LiveKit CLI will pick up LIVEKIT_API_KEY and LIVEKIT_URL from environment variables
-        # Make sure you have set them in your .env file or directly in your environment.
-        command = [
-            "lk",
-            "dispatch",
-            "create",
-            "--new-room",
-            "--agent-name",
-            "outbound-caller",
-            "--metadata",
-            metadata,
-        ]
-
-        # Set the PATH for the subprocess to include the local bin directory
-        env = os.environ.copy()
-        env["PATH"] = os.path.abspath(os.path.join(os.getcwd(), "bin")) + os.pathsep + env["PATH"]
-
-        st.info(f"Dispatching call to {phone_number}...")
+        st.info(f"Dispatching {len(numbers)} call(s)...")
 
         try:
-            # Run the command and capture output
-            result = subprocess.run(command, capture_output=True, text=True, check=True, env=env)
-            st.success(f"Call dispatched successfully! \nOutput:\n{result.stdout}")
-            if result.stderr:
-                st.warning(f"Warnings/Errors from dispatch command:\n{result.stderr}")
-        except subprocess.CalledProcessError as e:
-            st.error(f"Failed to dispatch call. Error:\n{e.stderr}\n{e.stdout}")
-        except FileNotFoundError:
-            st.error("LiveKit CLI (lk) not found. Please ensure it's installed and in your system's PATH.")
+            dispatches = asyncio.run(dispatch_calls(numbers, transfer_to_number.strip()))
+            for number, dispatch in zip(numbers, dispatches):
+                st.success(f"Call to {number} dispatched! \nDispatch ID: {dispatch.id}\nRoom: {dispatch.room}")
         except Exception as e:
-            st.error(f"An unexpected error occurred: {e}") 
\ No newline at end of file
+            st.error(f"Failed to dispatch calls. Error:\n{e}")